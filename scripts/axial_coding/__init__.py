@@ -4,6 +4,8 @@ from .prompt import (
     SYSTEM_PROMPT,
     USER_PROMPT_TEMPLATE,
     VALID_THEMES,
+    VALID_THEMES_SET,
+    format_batch_user_prompt,
     format_user_prompt,
 )
 
@@ -11,6 +13,8 @@ __all__ = [
     "SYSTEM_PROMPT",
     "USER_PROMPT_TEMPLATE",
     "VALID_THEMES",
+    "VALID_THEMES_SET",
+    "format_batch_user_prompt",
     "format_user_prompt",
 ]
 
@@ -0,0 +1,46 @@
+"""
+Exact-match on-disk cache for deterministic LLM calls.
+
+Keys are a sha256 over the full request (model, contents, config), so a
+repeated identical request skips the network round-trip and token billing
+entirely. Only use this for deterministic requests (temperature 0 / no
+sampling) where replaying the stored response is correct.
+"""
+
+import hashlib
+import shelve
+import threading
+from pathlib import Path
+
+import orjson
+
+DEFAULT_CACHE_FILE = "data/llm_cache.db"
+
+
+def cache_key(model, contents, **config_fields):
+    """Return a stable hash for one generate_content request."""
+    payload = {"model": model, "contents": contents, **config_fields}
+    return hashlib.sha256(
+        orjson.dumps(payload, option=orjson.OPT_SORT_KEYS, default=str)
+    ).hexdigest()
+
+
+class LLMCache:
+    """Thread-safe shelve file of {request hash: response text}."""
+
+    def __init__(self, cache_file: str = DEFAULT_CACHE_FILE):
+        Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+        self._shelf = shelve.open(cache_file)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._shelf.get(key)
+
+    def put(self, key, text):
+        with self._lock:
+            self._shelf[key] = text
+
+    def close(self):
+        with self._lock:
+            self._shelf.close()
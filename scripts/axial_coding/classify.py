@@ -5,22 +5,40 @@ Classifies feedback items using Gemini 2.5 Flash via Vertex AI.
 Supports resumption, crash recovery, and limiting for testing.
 """
 
+import atexit
+import hashlib
 import json
 import os
+import queue
+import random
+import re
+import shelve
 import sys
 import argparse
 import logging
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from itertools import islice
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, Dict, Any
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import httpx
+import ijson
+import orjson
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from scripts.axial_coding.prompt import (
     SYSTEM_PROMPT,
+    TRENDS_CHUNK_PROMPT_TEMPLATE,
+    TRENDS_REDUCE_PROMPT_TEMPLATE,
+    TRENDS_SYSTEM_PROMPT,
+    format_batch_user_prompt,
     format_user_prompt,
-    VALID_THEMES,
+    VALID_THEMES_SET,
 )
 
 
@@ -31,6 +49,149 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Writer thread tuning: results per write and output buffer size
+WRITER_BATCH_SIZE = 64
+WRITER_BUFFER_SIZE = 1 << 20
+
+# Fast path for resume: our own NDJSON lines always carry alert_id
+_ALERT_ID_RE = re.compile(rb'"alert_id"\s*:\s*"([^"]+)"')
+
+# Global Vertex AI endpoint; the regional default silently bypasses
+# Provisioned Throughput and falls back to ON_DEMAND quota
+GLOBAL_VERTEX_ENDPOINT = "https://aiplatform.googleapis.com"
+
+# Chunk size for map-reduce trend extraction
+TRENDS_CHUNK_SIZE = 200
+
+# Retry tuning: transient throttling/unavailability is retried with
+# exponential backoff + jitter instead of dropping the alert
+RETRYABLE_STATUS_CODES = (429, 503)
+MAX_RETRIES = 5
+MAX_BACKOFF_SECONDS = 30.0
+
+# GENERATION content is either bare JSON or wrapped in ```json fences
+_FENCE_RE = re.compile(r'^\s*(?:```json)?\s*(\{.*\})\s*(?:```)?\s*$', re.DOTALL)
+
+
+def _utc_timestamp() -> str:
+    """Second-granularity UTC timestamp for processed_at fields."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _extract_comment(item: Dict[str, Any]) -> Optional[str]:
+    """
+    Return the item's usable human comment, or None.
+
+    Prefers metadata.human_comment, falling back to the first
+    sufficiently-long comment (or value) in feedback_scores.
+    """
+    comment = item.get("metadata", {}).get("human_comment")
+    if _is_meaningful(comment):
+        return comment
+
+    for score in item.get("feedback_scores", []):
+        candidate = score.get("comment") or score.get("value")
+        if _is_meaningful(candidate):
+            return candidate
+
+    return None
+
+
+def _is_meaningful(comment: Any) -> bool:
+    """True when the comment has more than 10 non-whitespace-padded chars.
+
+    The raw length guard rejects short strings before .strip() allocates
+    a copy; KB-scale free-text comments only strip when they can pass.
+    """
+    return (
+        isinstance(comment, str)
+        and len(comment) > 10
+        and len(comment.strip()) > 10
+    )
+
+
+def _first_generation_obs(observations: list) -> Optional[Dict[str, Any]]:
+    """Return the first GENERATION observation carrying output, if any."""
+    return next(
+        (
+            o for o in observations
+            if (o.get("type") == "GENERATION" or o.get("name") == "llm:generate")
+            and o.get("output")
+        ),
+        None,
+    )
+
+
+def _parse_generation(obs: Optional[Dict[str, Any]]) -> tuple:
+    """
+    Parse a GENERATION observation into prompt-ready fields.
+
+    Returns:
+        (ai_verdict, ai_justification, event_summary, investigative_gaps)
+    """
+    ai_verdict = "N/A"
+    ai_justification = "N/A"
+    event_summary = "N/A"
+    investigative_gaps = "N/A"
+
+    if obs is not None:
+        # Outputs are usually {"content": ...} dicts, but some traces
+        # carry the generation payload as a bare string
+        output = obs["output"]
+        content = output.get("content") if isinstance(output, dict) else output
+        if not isinstance(content, str):
+            content = ""
+        # Fast path: bare JSON needs no fence stripping
+        stripped = content.strip()
+        if stripped.startswith("{"):
+            payload = stripped
+        else:
+            m = _FENCE_RE.search(content)
+            payload = m.group(1) if m else ""
+        try:
+            gen_data = orjson.loads(payload)
+            if isinstance(gen_data, dict) and "properties" in gen_data:
+                gen_data = gen_data["properties"]
+
+            ai_verdict = gen_data.get("final_decision", "N/A")
+            ai_justification = gen_data.get("justification", "N/A")
+            event_summary = gen_data.get("event_summary", "N/A")
+            gaps = gen_data.get("investigative_gaps", [])
+            investigative_gaps = ", ".join(gaps) if gaps else "N/A"
+        except orjson.JSONDecodeError:
+            pass
+
+    return (ai_verdict, ai_justification, event_summary, investigative_gaps)
+
+
+def stream_feedback_items(path: Path):
+    """
+    Stream feedback items from feedback_alerts.json with ijson.
+
+    Each item is projected down to the fields classification needs; the
+    GENERATION content is parsed here, single-threaded, so the worker
+    threads stay pure-I/O, and the bulky trace payload is dropped as the
+    file streams.
+
+    Args:
+        path: Path to feedback_alerts.json
+
+    Yields:
+        Slim feedback item dicts carrying pre-parsed "_gen" fields
+    """
+    with open(path, "rb") as f:
+        for item in ijson.items(f, "item", use_float=True):
+            traces = item.get("traces") or []
+            gen_obs = None
+            if traces:
+                gen_obs = _first_generation_obs(traces[0].get("observations") or [])
+            yield {
+                "alert_id": item.get("alert_id"),
+                "metadata": item.get("metadata", {}),
+                "feedback_scores": item.get("feedback_scores", []),
+                "_gen": _parse_generation(gen_obs),
+            }
+
 
 class ThemeClassifier:
     """Classifies feedback items into predefined themes using Gemini."""
@@ -40,31 +201,221 @@ class ThemeClassifier:
         project_id: str,
         location: str = "us-central1",
         output_file: str = "data/axial_coding.json",
+        cache_file: str = "data/classify_cache.db",
+        endpoint: str = GLOBAL_VERTEX_ENDPOINT,
+        num_workers: int = 5,
     ):
         """
         Initialize classifier.
-        
+
         Args:
             project_id: GCP project ID for Vertex AI
             location: GCP location (default: us-central1)
             output_file: Path to write NDJSON results
+            cache_file: Path to the on-disk classification cache
+            endpoint: Vertex AI base URL (default: global endpoint)
+            num_workers: Expected worker-thread count, used to size the
+                HTTP connection pool
         """
         self.project_id = project_id
         self.location = location
         self.output_file = Path(output_file)
+
+        # On-disk cache: identical (comment, AI verdict) pairs skip Gemini
+        self._cache = shelve.open(cache_file)
+        self._cache_lock = threading.Lock()
         
-        # Initialize Vertex AI client
+        # Initialize Vertex AI client against the global endpoint so any
+        # purchased Provisioned Throughput quota is actually used
         logger.info(f"Initializing Vertex AI client (project={project_id}, location={location})")
+        # The connection pool must cover the worker threads or parallel
+        # calls serialize behind head-of-line blocking on a few sockets
         self.client = genai.Client(
             vertexai=True,
             project=project_id,
             location=location,
+            http_options=types.HttpOptions(
+                api_version="v1",
+                base_url=endpoint,
+                client_args={
+                    "limits": httpx.Limits(
+                        max_connections=num_workers * 2,
+                        max_keepalive_connections=num_workers * 2,
+                    )
+                },
+            ),
         )
+        self._traffic_type_logged = False
+
+        # Adaptive concurrency: run() installs a semaphore sized to its
+        # worker count; repeated 429s shed permits, successes restore them
+        self._throttle: Optional[threading.Semaphore] = None
+        self._permit_lock = threading.Lock()
+        self._shed_permits = 0
+        self._num_workers = 0
         
+        # Request configs are identical for every call, so build the
+        # schema trees once instead of per item/batch
+        (
+            self._classify_config,
+            self._batch_config,
+            self._trends_config,
+        ) = self._build_request_configs()
+
         # Track processed items for resume support
         self.processed_ids = self._load_processed_ids()
         logger.info(f"Loaded {len(self.processed_ids)} previously processed items")
+
+        # Background NDJSON writer: results are queued and written in
+        # batches by a single thread instead of an open/append per result.
+        # Raw O_APPEND fd: appends are atomic on POSIX and skip the
+        # Python file-object lock and buffering layer entirely.
+        self._out_fd = os.open(
+            self.output_file,
+            os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC,
+            0o644,
+        )
+        self._out_closed = False
+        self._write_error: Optional[OSError] = None
+        self._save_queue: queue.Queue = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer_thread.start()
+        atexit.register(self.close)
     
+    def _shed_permit(self) -> None:
+        """Temporarily drop one unit of concurrency after throttling."""
+        with self._permit_lock:
+            if (
+                self._throttle is not None
+                and self._shed_permits < self._num_workers - 1
+                and self._throttle.acquire(blocking=False)
+            ):
+                self._shed_permits += 1
+                logger.info(
+                    f"Throttled: concurrency reduced to "
+                    f"{self._num_workers - self._shed_permits}"
+                )
+
+    def _restore_permit(self) -> None:
+        """Restore one unit of concurrency after a successful call."""
+        with self._permit_lock:
+            if self._shed_permits > 0:
+                self._shed_permits -= 1
+                self._throttle.release()
+
+    def _generate_with_retry(self, contents: str, config) -> Any:
+        """
+        Call Gemini with retry on transient errors.
+
+        Retries 429/503 responses with exponential backoff and jitter so a
+        throttled batch is not permanently dropped, and sheds a permit of
+        concurrency on 429 so throughput settles near the API's limit.
+        """
+        delay = 1.0
+        for attempt in range(1, MAX_RETRIES + 1):
+            gate = self._throttle if self._throttle is not None else nullcontext()
+            with gate:
+                try:
+                    response = self.client.models.generate_content(
+                        model="gemini-2.5-flash",
+                        contents=contents,
+                        config=config,
+                    )
+                except Exception as e:
+                    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+                    if code not in RETRYABLE_STATUS_CODES or attempt == MAX_RETRIES:
+                        raise
+                else:
+                    self._restore_permit()
+                    return response
+
+            if code == 429:
+                self._shed_permit()
+
+            sleep_s = min(delay, MAX_BACKOFF_SECONDS) * (0.5 + random.random())
+            logger.warning(
+                f"Retryable error ({code}), attempt {attempt}/{MAX_RETRIES}, "
+                f"backing off {sleep_s:.1f}s"
+            )
+            time.sleep(sleep_s)
+            delay *= 2
+
+    def _log_traffic_type(self, response) -> None:
+        """Log whether Provisioned Throughput served us (first call only)."""
+        if self._traffic_type_logged:
+            return
+        self._traffic_type_logged = True
+        usage = getattr(response, "usage_metadata", None)
+        traffic = getattr(usage, "traffic_type", None)
+        if traffic is not None:
+            logger.info(f"Vertex AI traffic type: {traffic}")
+
+    @staticmethod
+    def _build_request_configs():
+        """Build the per-item, batch and trends GenerateContentConfig objects."""
+        result_properties = {
+            "theme": types.Schema(type=types.Type.STRING),
+            "confidence": types.Schema(type=types.Type.STRING),
+            "reasoning": types.Schema(type=types.Type.STRING),
+            "missing_context": types.Schema(type=types.Type.STRING),
+            "trend_insight": types.Schema(type=types.Type.STRING),
+        }
+        result_required = ["theme", "confidence", "reasoning", "trend_insight"]
+
+        classify_config = types.GenerateContentConfig(
+            system_instruction=SYSTEM_PROMPT,
+            response_schema=types.Schema(
+                type=types.Type.OBJECT,
+                properties=dict(result_properties),
+                required=list(result_required),
+            ),
+            response_mime_type="application/json",
+        )
+        batch_config = types.GenerateContentConfig(
+            system_instruction=SYSTEM_PROMPT,
+            response_schema=types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "alert_id": types.Schema(type=types.Type.STRING),
+                        **result_properties,
+                    },
+                    required=["alert_id"] + result_required,
+                ),
+            ),
+            response_mime_type="application/json",
+        )
+        trends_config = types.GenerateContentConfig(
+            system_instruction=TRENDS_SYSTEM_PROMPT,
+            response_schema=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "trends": types.Schema(
+                        type=types.Type.ARRAY,
+                        items=types.Schema(
+                            type=types.Type.OBJECT,
+                            properties={
+                                "title": types.Schema(type=types.Type.STRING),
+                                "description": types.Schema(type=types.Type.STRING),
+                                "affected_tenants": types.Schema(
+                                    type=types.Type.ARRAY,
+                                    items=types.Schema(type=types.Type.STRING),
+                                ),
+                                "severity": types.Schema(type=types.Type.STRING),
+                                "recommendation": types.Schema(type=types.Type.STRING),
+                            },
+                            required=["title", "description", "severity"],
+                        ),
+                    ),
+                    "summary": types.Schema(type=types.Type.STRING),
+                },
+                required=["trends", "summary"],
+            ),
+            response_mime_type="application/json",
+        )
+        return classify_config, batch_config, trends_config
+
     def _load_processed_ids(self) -> set:
         """Load alert_ids that have already been processed."""
         if not self.output_file.exists():
@@ -72,188 +423,442 @@ class ThemeClassifier:
         
         processed = set()
         try:
-            with open(self.output_file, 'r') as f:
+            with open(self.output_file, 'rb', buffering=WRITER_BUFFER_SIZE) as f:
                 for line in f:
-                    if line.strip():
-                        try:
-                            data = json.loads(line)
-                            processed.add(data.get("alert_id"))
-                        except json.JSONDecodeError:
-                            logger.warning(f"Skipping malformed JSON line: {line[:50]}")
+                    if not line.strip():
+                        continue
+                    # We wrote these lines ourselves, so a regex grab of
+                    # alert_id avoids a full dict decode per line
+                    m = _ALERT_ID_RE.search(line)
+                    if m:
+                        processed.add(m.group(1).decode())
+                        continue
+                    try:
+                        data = orjson.loads(line)
+                        processed.add(data.get("alert_id"))
+                    except orjson.JSONDecodeError:
+                        logger.warning(f"Skipping malformed JSON line: {line[:50]}")
         except Exception as e:
             logger.error(f"Error loading processed IDs: {e}")
-        
+
         return processed
     
     def _save_result(self, result: Dict[str, Any]) -> None:
-        """Append classification result to NDJSON file."""
+        """Queue a classification result for the writer thread.
+
+        Deliberately nothing but the enqueue: this runs on the main
+        consumption loop, which should return to as_completed immediately.
+        """
+        self._save_queue.put(result)
+
+    def _writer_loop(self) -> None:
+        """Drain the save queue, writing results to NDJSON in batches."""
+        while True:
+            item = self._save_queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # Opportunistically drain more pending results without blocking
+            while len(batch) < WRITER_BATCH_SIZE:
+                try:
+                    nxt = self._save_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._write_batch(batch)
+                    return
+                batch.append(nxt)
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """Write a batch of results as NDJSON lines in one os.write."""
+        buf = bytearray()
+        for r in batch:
+            buf += orjson.dumps(r)
+            buf += b"\n"
         try:
-            with open(self.output_file, 'a') as f:
-                f.write(json.dumps(result) + '\n')
-            logger.debug(f"Saved result for {result['alert_id']}")
-        except Exception as e:
-            logger.error(f"Error saving result: {e}")
-            raise
-    
+            os.write(self._out_fd, buf)
+        except OSError as e:
+            # Remember the first failure; close() raises it so dropped
+            # batches are never reported as a successful run
+            if self._write_error is None:
+                self._write_error = e
+            logger.error(f"Error writing results: {e}")
+
+    def close(self) -> None:
+        """Flush pending results and close the output file and cache.
+
+        Raises:
+            RuntimeError: If any result batch failed to write.
+        """
+        if self._out_closed:
+            return
+        self._out_closed = True
+        self._save_queue.put(None)
+        self._writer_thread.join(timeout=10)
+        # Only close the fd once the writer has actually exited; closing
+        # under a still-flushing thread would race os.write against EBADF
+        if self._writer_thread.is_alive():
+            logger.error("Writer thread did not flush within 10s; leaving output fd open")
+        else:
+            os.close(self._out_fd)
+        with self._cache_lock:
+            self._cache.close()
+        if self._write_error is not None:
+            raise RuntimeError(
+                f"Failed to write classification results: {self._write_error}"
+            ) from self._write_error
+
+    def _build_prompt_fields(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Extract prompt fields from a feedback item.
+
+        Args:
+            item: Feedback item from feedback_alerts.json
+
+        Returns:
+            Keyword arguments for format_user_prompt, or None if the item
+            has no usable human comment
+        """
+        alert_id = item.get("alert_id")
+        metadata = item.get("metadata", {})
+
+        # run() stashes the comment during its filter pass; fall back to
+        # extraction for direct callers
+        human_comment = item.get("_comment") or _extract_comment(item)
+        if not human_comment:
+            logger.debug(f"Skipping {alert_id}: comment too short")
+            return None
+
+        # GENERATION data is pre-parsed by the streaming loader; extract
+        # from traces only for direct callers with raw items
+        gen = item.get("_gen")
+        if gen is None:
+            traces = item.get("traces", [])
+            obs = _first_generation_obs(traces[0].get("observations", [])) if traces else None
+            gen = _parse_generation(obs)
+        ai_verdict, ai_justification, event_summary, investigative_gaps = gen
+
+        return {
+            "alert_id": alert_id,
+            "tenant": metadata.get("account_short_name", "Unknown"),
+            "human_comment": human_comment,
+            "human_verdict": metadata.get("verdict", "N/A"),
+            "confirmation_status": metadata.get("triage_confirmation", "N/A"),
+            "ai_verdict": ai_verdict,
+            "ai_justification": ai_justification,
+            "event_summary": event_summary,
+            "investigative_gaps": investigative_gaps,
+        }
+
+    @staticmethod
+    def _cache_key(fields: Dict[str, Any]) -> str:
+        """Cache key: alerts sharing a comment and AI verdict classify alike."""
+        raw = f"{fields['human_comment']}|{fields['ai_verdict']}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _cache_get(
+        self,
+        fields: Dict[str, Any],
+        processed_at: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Return a cached result rebound to this alert, or None on miss."""
+        with self._cache_lock:
+            cached = self._cache.get(self._cache_key(fields))
+        if cached is None:
+            return None
+        result = dict(cached)
+        result["alert_id"] = fields["alert_id"]
+        result["processed_at"] = processed_at or _utc_timestamp()
+        logger.info(f"✓ {fields['alert_id']}: {result['theme']} (cached)")
+        return result
+
+    def _build_result(
+        self,
+        alert_id: str,
+        result_data: Dict[str, Any],
+        cache_key: Optional[str] = None,
+        processed_at: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Validate model output and build the NDJSON result record."""
+        theme = result_data.get("theme", "OTHER")
+        if theme not in VALID_THEMES_SET:
+            logger.warning(f"Invalid theme {theme} for {alert_id}, using OTHER")
+            theme = "OTHER"
+
+        result = {
+            "alert_id": alert_id,
+            "theme": theme,
+            "confidence": result_data.get("confidence", "UNKNOWN"),
+            "reasoning": result_data.get("reasoning", ""),
+            "missing_context": result_data.get("missing_context", ""),
+            "trend_insight": result_data.get("trend_insight", ""),
+            "processed_at": processed_at or _utc_timestamp(),
+        }
+
+        if cache_key is not None:
+            with self._cache_lock:
+                self._cache[cache_key] = result
+
+        logger.info(f"✓ {alert_id}: {theme} ({result['confidence']})")
+        return result
+
     def classify_item(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Classify a single feedback item.
-        
+
         Args:
             item: Feedback item from feedback_alerts.json
-            
+
         Returns:
             Classification result dict or None if classification fails
         """
         alert_id = item.get("alert_id")
-        
+
         # Skip if already processed
         if alert_id in self.processed_ids:
             logger.debug(f"Skipping already processed: {alert_id}")
             return None
-        
+
         try:
-            # Extract required fields
-            metadata = item.get("metadata", {})
-            human_comment = metadata.get("human_comment", "")
-            
-            # Fallback: Check feedback_scores for comments if not in metadata
-            if not human_comment:
-                scores = item.get("feedback_scores", [])
-                for score in scores:
-                    comment = score.get("comment") or score.get("value")
-                    if isinstance(comment, str) and len(comment.strip()) > 10:
-                        human_comment = comment
-                        break
-            
-            if not human_comment or len(human_comment.strip()) < 10:
-                logger.debug(f"Skipping {alert_id}: comment too short")
+            fields = self._build_prompt_fields(item)
+            if fields is None:
                 return None
-            
-            # Extract GENERATION data if available
-            traces = item.get("traces", [])
-            ai_verdict = "N/A"
-            ai_justification = "N/A"
-            event_summary = "N/A"
-            investigative_gaps = "N/A"
-            
-            if traces and len(traces) > 0:
-                observations = traces[0].get("observations", [])
-                for obs in observations:
-                    if (obs.get("type") == "GENERATION" \
-                    or obs.get("name") == "llm:generate") \
-                    and obs.get("output"):
-                        content = obs["output"].get("content", "")
-                        try:
-                            # Try to parse generation content
-                            json_str = content.replace('```json\n', '').replace('```', '').strip()
-                            gen_data = json.loads(json_str)
-                            if isinstance(gen_data, dict) and "properties" in gen_data:
-                                gen_data = gen_data["properties"]
-                            
-                            ai_verdict = gen_data.get("final_decision", "N/A")
-                            ai_justification = gen_data.get("justification", "N/A")
-                            event_summary = gen_data.get("event_summary", "N/A")
-                            gaps = gen_data.get("investigative_gaps", [])
-                            investigative_gaps = ", ".join(gaps) if gaps else "N/A"
-                        except json.JSONDecodeError:
-                            pass
-                        break
-            
+
+            # Serve identical (comment, AI verdict) pairs from the cache
+            cached = self._cache_get(fields)
+            if cached is not None:
+                return cached
+
             # Format user prompt
-            user_prompt = format_user_prompt(
-                alert_id=alert_id,
-                tenant=metadata.get("account_short_name", "Unknown"),
-                human_comment=human_comment,
-                human_verdict=metadata.get("verdict", "N/A"),
-                confirmation_status=metadata.get("triage_confirmation", "N/A"),
-                ai_verdict=ai_verdict,
-                ai_justification=ai_justification,  # Truncate for prompt length
-                event_summary=event_summary,
-                investigative_gaps=investigative_gaps,
-            )
-            
+            user_prompt = format_user_prompt(**fields)
+
             # Call Gemini
             logger.info(f"Classifying {alert_id}...")
-            response = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=user_prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=SYSTEM_PROMPT,
-                    response_schema=types.Schema(
-                        type=types.Type.OBJECT,
-                        properties={
-                            "theme": types.Schema(type=types.Type.STRING),
-                            "confidence": types.Schema(type=types.Type.STRING),
-                            "reasoning": types.Schema(type=types.Type.STRING),
-                            "missing_context": types.Schema(type=types.Type.STRING),
-                            "trend_insight": types.Schema(type=types.Type.STRING),
-                        },
-                        required=["theme", "confidence", "reasoning", "trend_insight"],
-                    ),
-                    response_mime_type="application/json",
-                ),
-            )
+            response = self._generate_with_retry(user_prompt, self._classify_config)
+            self._log_traffic_type(response)
             
             # Parse response
             try:
-                result_data = json.loads(response.text)
-            except json.JSONDecodeError:
+                result_data = orjson.loads(response.text)
+            except orjson.JSONDecodeError:
                 logger.error(f"Failed to parse response for {alert_id}: {response.text[:200]}")
                 return None
-            
-            # Validate theme
-            theme = result_data.get("theme", "OTHER")
-            if theme not in VALID_THEMES:
-                logger.warning(f"Invalid theme {theme} for {alert_id}, using OTHER")
-                theme = "OTHER"
-            
-            # Build result
-            result = {
-                "alert_id": alert_id,
-                "theme": theme,
-                "confidence": result_data.get("confidence", "UNKNOWN"),
-                "reasoning": result_data.get("reasoning", ""),
-                "missing_context": result_data.get("missing_context", ""),
-                "trend_insight": result_data.get("trend_insight", ""),
-                "processed_at": datetime.utcnow().isoformat() + "Z",
-            }
-            
-            logger.info(f"✓ {alert_id}: {theme} ({result['confidence']})")
-            return result
-            
+
+            return self._build_result(alert_id, result_data, cache_key=self._cache_key(fields))
+
         except Exception as e:
             logger.error(f"Error classifying {alert_id}: {e}", exc_info=True)
             return None
-    
-    def run(self, feedback_data: list, limit: Optional[int] = None, num_workers: int = 5) -> int:
+
+    def classify_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Run classification on feedback data with parallel processing.
-        
+        Classify a batch of feedback items with a single Gemini call.
+
+        Batching amortizes per-request network overhead and the shared
+        prompt prefix across several alerts. Falls back to per-item
+        classification when the batch response cannot be parsed or is
+        missing items.
+
+        Args:
+            items: Feedback items from feedback_alerts.json
+
+        Returns:
+            List of classification result dicts
+        """
+        # Build prompt fields, skipping processed/uncommented items
+        pending = []
+        for item in items:
+            alert_id = item.get("alert_id")
+            if alert_id in self.processed_ids:
+                logger.debug(f"Skipping already processed: {alert_id}")
+                continue
+            fields = self._build_prompt_fields(item)
+            if fields is not None:
+                pending.append((item, fields))
+
+        # One timestamp per batch; second granularity is fine for audit
+        # metadata and keeps formatting off the per-result path
+        stamp = _utc_timestamp()
+
+        # Serve cache hits directly; only misses go into the batch prompt
+        results = []
+        misses = []
+        for item, fields in pending:
+            cached = self._cache_get(fields, processed_at=stamp)
+            if cached is not None:
+                results.append(cached)
+            else:
+                misses.append((item, fields))
+        pending = misses
+
+        if not pending:
+            return results
+
+        try:
+            user_prompt = format_batch_user_prompt([f for _, f in pending])
+
+            logger.info(f"Classifying batch of {len(pending)} items...")
+            response = self._generate_with_retry(user_prompt, self._batch_config)
+            self._log_traffic_type(response)
+
+            rows = orjson.loads(response.text)
+            if not isinstance(rows, list):
+                raise ValueError("batch response is not a JSON array")
+
+        except Exception as e:
+            logger.warning(f"Batch classification failed ({e}), falling back to per-item")
+            for item, _ in pending:
+                result = self.classify_item(item)
+                if result:
+                    results.append(result)
+            return results
+
+        # Match returned rows back to the submitted alert_ids
+        key_by_id = {f["alert_id"]: self._cache_key(f) for _, f in pending}
+        matched_ids = set()
+        for row in rows:
+            if not isinstance(row, dict):
+                continue
+            alert_id = row.get("alert_id")
+            if alert_id not in key_by_id or alert_id in matched_ids:
+                continue
+            matched_ids.add(alert_id)
+            results.append(
+                self._build_result(
+                    alert_id, row, cache_key=key_by_id[alert_id], processed_at=stamp
+                )
+            )
+
+        # Retry anything the model dropped from the array per-item
+        for item, fields in pending:
+            if fields["alert_id"] not in matched_ids:
+                logger.warning(
+                    f"Batch response missing {fields['alert_id']}, retrying per-item"
+                )
+                result = self.classify_item(item)
+                if result:
+                    results.append(result)
+
+        return results
+
+    def _extract_chunk_trends(self, chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Extract partial trends from one chunk of classified items."""
+        # Compact separators: every indent space in the prompt is a billed
+        # input token
+        prompt = TRENDS_CHUNK_PROMPT_TEMPLATE.format(
+            items_json=json.dumps(chunk, separators=(",", ":"))
+        )
+        try:
+            response = self._generate_with_retry(prompt, self._trends_config)
+            data = orjson.loads(response.text)
+            return data.get("trends", [])
+        except Exception as e:
+            logger.error(f"Error extracting chunk trends: {e}")
+            return []
+
+    def generate_global_trends(
+        self,
+        results: List[Dict[str, Any]],
+        output_file: str = "data/global_trends.json",
+        num_workers: int = 5,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Summarize classification results into global trends, map-reduce style.
+
+        Chunks of results are condensed concurrently into partial trend
+        lists, then a final reduction call merges the partials into the
+        global trend list and summary. Keeping each prompt to a chunk
+        avoids one giant request that is slow and silently truncated.
+
+        Args:
+            results: Classification result dicts (the NDJSON output)
+            output_file: Path to write the global trends JSON
+            num_workers: Number of concurrent chunk summarizations
+
+        Returns:
+            The global trends dict, or None if extraction failed
+        """
+        compact_data = [
+            {"theme": r.get("theme"), "trend_insight": r.get("trend_insight")}
+            for r in results
+            if r.get("trend_insight")
+        ]
+        if not compact_data:
+            logger.warning("No trend insights available, skipping global trends")
+            return None
+
+        chunks = list(self._chunked(compact_data, TRENDS_CHUNK_SIZE))
+        logger.info(
+            f"Extracting trends from {len(compact_data)} items "
+            f"in {len(chunks)} chunks"
+        )
+
+        # Map: condense each chunk into a partial trend list concurrently
+        partial_trends: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [
+                executor.submit(self._extract_chunk_trends, chunk)
+                for chunk in chunks
+            ]
+            for future in as_completed(futures):
+                partial_trends.extend(future.result())
+
+        if not partial_trends:
+            logger.warning("No partial trends extracted, skipping reduction")
+            return None
+
+        # Reduce: merge the partial trend lists into the global summary
+        reduce_prompt = TRENDS_REDUCE_PROMPT_TEMPLATE.format(
+            partials_json=json.dumps(partial_trends, separators=(",", ":"))
+        )
+        try:
+            response = self._generate_with_retry(reduce_prompt, self._trends_config)
+            global_trends = orjson.loads(response.text)
+        except Exception as e:
+            logger.error(f"Error reducing global trends: {e}")
+            return None
+
+        out_path = Path(output_file)
+        out_path.write_bytes(orjson.dumps(global_trends, option=orjson.OPT_INDENT_2))
+        logger.info(
+            f"Saved {len(global_trends.get('trends', []))} global trends to {out_path}"
+        )
+        return global_trends
+
+    @staticmethod
+    def _chunked(items: list, size: int):
+        """Yield successive chunks of at most `size` items."""
+        it = iter(items)
+        while chunk := list(islice(it, size)):
+            yield chunk
+
+    def run(
+        self,
+        feedback_data: list,
+        limit: Optional[int] = None,
+        num_workers: int = 5,
+        batch_size: int = 10,
+    ) -> int:
+        """
+        Run classification on feedback data with parallel batched processing.
+
         Args:
             feedback_data: List of feedback items from feedback_alerts.json
             limit: Maximum number of items to process (for testing)
             num_workers: Number of parallel worker threads (default: 5)
-            
+            batch_size: Number of items per Gemini request (default: 10)
+
         Returns:
             Number of items successfully classified
         """
-        # Filter to items with comments
+        # Filter to items with comments, stashing the extracted comment so
+        # classification does not repeat the feedback_scores scan
         items_with_comments = []
         for item in feedback_data:
-            metadata = item.get("metadata", {})
-            comment = metadata.get("human_comment")
-            
-            # Fallback for checking feedback_scores
-            if not comment:
-                for score in item.get("feedback_scores", []):
-                    s_comment = score.get("comment")
-                    if isinstance(s_comment, str) and len(s_comment.strip()) > 10:
-                        comment = s_comment
-                        break
-            
-            # Check if comment is a string and has sufficient length
-            if isinstance(comment, str) and len(comment.strip()) > 10:
+            comment = _extract_comment(item)
+            if comment:
+                item["_comment"] = comment
                 items_with_comments.append(item)
         
         logger.info(f"Found {len(items_with_comments)} items with valid comments")
@@ -269,34 +874,94 @@ class ThemeClassifier:
             if item.get("alert_id") not in self.processed_ids
         ]
         
-        logger.info(f"Processing {len(to_process)} new items with {num_workers} workers")
-        
+        # Collapse duplicate (comment, AI verdict) pairs: classify one
+        # representative per group and fan the result out to all members
+        rep_groups: Dict[str, List[dict]] = {}
+        reps: List[dict] = []
+        group_index: Dict[tuple, str] = {}
+        for item in to_process:
+            fields = self._build_prompt_fields(item)
+            if fields is None:
+                continue
+            key = (fields["human_comment"].strip().lower(), fields["ai_verdict"])
+            rep_id = group_index.get(key)
+            if rep_id is None:
+                group_index[key] = item.get("alert_id")
+                rep_groups[item.get("alert_id")] = [item]
+                reps.append(item)
+            else:
+                rep_groups[rep_id].append(item)
+
+        if len(reps) != len(to_process):
+            logger.info(
+                f"Deduplicated {len(to_process)} items into "
+                f"{len(reps)} unique classifications"
+            )
+
+        logger.info(
+            f"Processing {len(to_process)} new items in batches of "
+            f"{batch_size} with {num_workers} workers"
+        )
+
         success_count = 0
         completed_count = 0
-        
-        # Use ThreadPoolExecutor for parallel processing
+        total = len(to_process)
+        last_log_ts = 0.0
+
+        # Gate concurrent API calls so throttling can shed permits
+        self._num_workers = num_workers
+        self._throttle = threading.Semaphore(num_workers)
+
+        # Cap outstanding futures so the full dataset is never pinned in
+        # the executor queue at once
+        max_inflight = 2 * num_workers
+
+        # Use ThreadPoolExecutor for parallel batch processing
         with ThreadPoolExecutor(max_workers=num_workers) as executor:
-            # Submit all tasks
-            future_to_item = {
-                executor.submit(self.classify_item, item): item 
-                for item in to_process
-            }
-            
-            # Process results as they complete
-            for future in as_completed(future_to_item):
-                completed_count += 1
-                result = future.result()
-                
-                if result:
-                    self._save_result(result)
-                    success_count += 1
-                    self.processed_ids.add(result["alert_id"])
-                
-                # Progress indicator
-                progress_pct = (completed_count / len(to_process)) * 100
-                progress_bar = self._get_progress_bar(completed_count, len(to_process))
-                logger.info(f"{progress_bar} {completed_count}/{len(to_process)} ({progress_pct:.1f}%)")
-        
+            inflight: deque = deque()
+            future_to_batch: Dict[Any, list] = {}
+
+            def _drain_one() -> None:
+                nonlocal success_count, completed_count, last_log_ts
+                future = next(as_completed(inflight))
+                inflight.remove(future)
+                batch = future_to_batch.pop(future)
+                completed_count += sum(
+                    len(rep_groups.get(it.get("alert_id"), (it,))) for it in batch
+                )
+
+                for result in future.result():
+                    # Fan the representative's result out to every group member
+                    for member in rep_groups.get(result["alert_id"], (None,)):
+                        if member is None or member.get("alert_id") == result["alert_id"]:
+                            fanned = result
+                        else:
+                            fanned = dict(result)
+                            fanned["alert_id"] = member.get("alert_id")
+                        self._save_result(fanned)
+                        success_count += 1
+                        self.processed_ids.add(fanned["alert_id"])
+
+                # Progress indicator, rate-limited so fast (cached) runs
+                # don't spend their time formatting log lines
+                now = time.monotonic()
+                if now - last_log_ts > 1.0 or completed_count == total:
+                    last_log_ts = now
+                    progress_pct = (completed_count / total) * 100
+                    progress_bar = self._get_progress_bar(completed_count, total)
+                    logger.info(f"{progress_bar} {completed_count}/{total} ({progress_pct:.1f}%)")
+
+            # Sliding-window submission: block when the window is full
+            for batch in self._chunked(reps, batch_size):
+                while len(inflight) >= max_inflight:
+                    _drain_one()
+                future = executor.submit(self.classify_batch, batch)
+                inflight.append(future)
+                future_to_batch[future] = batch
+
+            while inflight:
+                _drain_one()
+
         logger.info(f"Classification complete: {success_count}/{len(to_process)} successful")
         return success_count
     
@@ -346,7 +1011,23 @@ def main():
         default=5,
         help="Number of parallel worker threads (default: 5)",
     )
-    
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10,
+        help="Number of items per Gemini request (default: 10)",
+    )
+    parser.add_argument(
+        "--endpoint",
+        default=GLOBAL_VERTEX_ENDPOINT,
+        help=f"Vertex AI base URL (default: {GLOBAL_VERTEX_ENDPOINT})",
+    )
+    parser.add_argument(
+        "--trends",
+        action="store_true",
+        help="Generate data/global_trends.json from the classification results",
+    )
+
     args = parser.parse_args()
     
     # Load env if available
@@ -365,8 +1046,7 @@ def main():
         sys.exit(1)
     
     logger.info(f"Loading feedback data from {input_path}")
-    with open(input_path, 'r') as f:
-        feedback_data = json.load(f)
+    feedback_data = list(stream_feedback_items(input_path))
     logger.info(f"Loaded {len(feedback_data)} feedback items")
     
     # Run classifier
@@ -374,10 +1054,23 @@ def main():
         project_id=project_id,
         location=args.location,
         output_file=args.output,
+        endpoint=args.endpoint,
+        num_workers=args.workers,
     )
     
-    success_count = classifier.run(feedback_data, limit=args.limit, num_workers=args.workers)
-    
+    success_count = classifier.run(
+        feedback_data,
+        limit=args.limit,
+        num_workers=args.workers,
+        batch_size=args.batch_size,
+    )
+    if args.trends:
+        with open(args.output, "rb") as f:
+            results = [orjson.loads(line) for line in f if line.strip()]
+        classifier.generate_global_trends(results, num_workers=args.workers)
+
+    classifier.close()
+
     logger.info(f"Successfully classified {success_count} items")
     logger.info(f"Results saved to {args.output}")
 
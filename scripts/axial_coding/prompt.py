@@ -191,15 +191,82 @@ Based on the human comment and AI analysis, classify this feedback into one of t
 Respond with valid JSON only."""
 
 
-# Theme enum for validation
-VALID_THEMES = [
+BATCH_USER_PROMPT_HEADER = """Classify each of the following security alert feedback items into one of the predefined themes and derive trend insights.
+
+Respond with a JSON array containing exactly one classification object per item, in the same order as the items below. Each object MUST include the item's "alert_id" so results can be matched back.
+
+"""
+
+BATCH_ITEM_TEMPLATE = """## Item {index}
+
+**Alert ID**: {alert_id}
+**Tenant**: {tenant}
+**Human Verdict**: {human_verdict}
+**Confirmation Status**: {confirmation_status}
+
+### Human Comment
+{human_comment}
+
+### AI Analysis (from GENERATION observation)
+**AI Verdict**: {ai_verdict}
+**AI Justification**: {ai_justification}
+**Event Summary**: {event_summary}
+**Investigative Gaps**: {investigative_gaps}
+"""
+
+BATCH_USER_PROMPT_FOOTER = """---
+
+Classify every item above. Respond with a valid JSON array only — one object per item, each with its "alert_id"."""
+
+
+TRENDS_SYSTEM_PROMPT = """You are a security operations analyst summarizing classified human feedback on AI-generated alert verdicts.
+
+Given a list of classified feedback items (theme plus trend insight), identify the broader recurring trends. For each trend provide a title, a description of the systemic issue, the affected tenants, a severity (HIGH/MEDIUM/LOW), and a concrete recommendation.
+
+Respond with valid JSON only:
+```json
+{
+  "trends": [
+    {
+      "title": "<short trend title>",
+      "description": "<systemic issue this trend reflects>",
+      "affected_tenants": ["<tenant>", ...],
+      "severity": "<HIGH|MEDIUM|LOW>",
+      "recommendation": "<concrete remediation recommendation>"
+    }
+  ],
+  "summary": "<one-paragraph overall summary>"
+}
+```
+"""
+
+TRENDS_CHUNK_PROMPT_TEMPLATE = """Identify recurring trends in the following classified feedback items.
+
+## Classified Items
+{items_json}
+
+Respond with valid JSON only, as defined in the system instructions."""
+
+TRENDS_REDUCE_PROMPT_TEMPLATE = """The following trend lists were extracted from separate chunks of the same feedback corpus. Merge them into one deduplicated global trend list and overall summary, combining trends that describe the same systemic issue.
+
+## Partial Trends
+{partials_json}
+
+Respond with valid JSON only, as defined in the system instructions."""
+
+
+# Theme enum, in display order (docs/UI)
+VALID_THEMES = (
     "AUTHORIZED_USER_ACTIVITY",
-    "AI_VERDICT_INCONSISTENCY", 
+    "AI_VERDICT_INCONSISTENCY",
     "LEGITIMATE_SOFTWARE",
     "ORGANIZATIONAL_POLICY",
     "INSUFFICIENT_EVIDENCE",
     "OTHER",
-]
+)
+
+# O(1) membership checks on the validation hot path
+VALID_THEMES_SET = frozenset(VALID_THEMES)
 
 
 def format_user_prompt(
@@ -243,6 +310,24 @@ def format_user_prompt(
     )
 
 
+def format_batch_user_prompt(items: list) -> str:
+    """
+    Format a batch user prompt from multiple alert contexts.
+
+    Args:
+        items: List of dicts with the same keys accepted by
+            format_user_prompt (alert_id, tenant, human_comment, ...)
+
+    Returns:
+        Single prompt string covering all items, asking for a JSON array
+    """
+    sections = [BATCH_USER_PROMPT_HEADER]
+    for idx, item in enumerate(items, 1):
+        sections.append(BATCH_ITEM_TEMPLATE.format(index=idx, **item))
+    sections.append(BATCH_USER_PROMPT_FOOTER)
+    return "\n".join(sections)
+
+
 # Example usage
 if __name__ == "__main__":
     # Example of how to use the prompt
@@ -1,66 +1,40 @@
 import streamlit as st
-import pandas as pd
-import json
-from pathlib import Path
-import plotly.express as px
+import numpy as np
+
+from _dashboard_common import (
+    AXIAL_CODING_FILE,
+    FEEDBACK_ALERTS_FILE,
+    build_results_df,
+    confidence_histogram,
+    load_data,
+    theme_pie,
+    to_csv_bytes,
+)
 
 st.set_page_config(page_title="Alert Triage Analysis Dashboard", layout="wide")
 
 st.title("🛡️ AI-Powered Alert Triage Analysis")
 st.markdown("### Visualization of Axial Coding & Theme Classification")
 
-# Paths
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
-AXIAL_CODING_FILE = PROJECT_ROOT / "data" / "axial_coding.json"
-FEEDBACK_ALERTS_FILE = PROJECT_ROOT / "data" / "feedback_alerts.json"
-
-def load_data():
-    # Load original feedback data
-    if not FEEDBACK_ALERTS_FILE.exists():
-        st.error(f"Missing {FEEDBACK_ALERTS_FILE}. Run `fetch_traces.py` first.")
-        return None, None
-    
-    with open(FEEDBACK_ALERTS_FILE, 'r') as f:
-        feedback_data = json.load(f)
-    
-    # Load axial coding results (NDJSON)
-    if not AXIAL_CODING_FILE.exists():
+if not FEEDBACK_ALERTS_FILE.exists():
+    st.error(f"Missing {FEEDBACK_ALERTS_FILE}. Run `fetch_traces.py` first.")
+    feedback_data, results_data = None, None
+    feedback_by_id, results_by_id = None, None
+else:
+    fb_mtime = FEEDBACK_ALERTS_FILE.stat().st_mtime
+    ax_mtime = AXIAL_CODING_FILE.stat().st_mtime if AXIAL_CODING_FILE.exists() else 0
+    feedback_data, results_data, feedback_by_id, results_by_id = load_data(fb_mtime, ax_mtime)
+    if results_data is None:
         st.warning(f"No results found in {AXIAL_CODING_FILE}. Run `classify.py` first.")
-        return feedback_data, None
-    
-    results = []
-    with open(AXIAL_CODING_FILE, 'r') as f:
-        for line in f:
-            if line.strip():
-                results.append(json.loads(line))
-    
-    return feedback_data, results
-
-feedback_data, results_data = load_data()
 
 if feedback_data:
     # Sidebar stats
     st.sidebar.header("Data Summary")
     st.sidebar.metric("Total Alerts", len(feedback_data))
-    
+
     if results_data:
-        df_results = pd.DataFrame(results_data)
-        
-        # Merge with verdict info from feedback_data
-        verdict_map = {item['alert_id']: item.get('metadata', {}).get('verdict', 'N/A') 
-                      for item in feedback_data}
-        df_results['verdict'] = df_results['alert_id'].map(verdict_map)
-        
-        # Merge with triage confirmation info
-        conf_map = {item['alert_id']: item.get('metadata', {}).get('triage_confirmation', 'N/A') 
-                   for item in feedback_data}
-        df_results['confirmation'] = df_results['alert_id'].map(conf_map)
-        
-        # Merge with human comment info
-        comment_map = {item['alert_id']: item.get('metadata', {}).get('human_comment', 'N/A') 
-                      for item in feedback_data}
-        df_results['comment'] = df_results['alert_id'].map(comment_map)
-        
+        df_results = build_results_df(fb_mtime, ax_mtime)
+
         st.sidebar.metric("Classified Alerts", len(df_results))
         
         # Main Dashboard Layout
@@ -68,14 +42,11 @@ if feedback_data:
         
         with col1:
             st.subheader("Theme Distribution")
-            fig_themes = px.pie(df_results, names='theme', color_discrete_sequence=px.colors.qualitative.Pastel)
-            st.plotly_chart(fig_themes, use_container_width=True)
-            
+            st.plotly_chart(theme_pie(df_results), use_container_width=True)
+
         with col2:
             st.subheader("Confidence Levels")
-            fig_conf = px.histogram(df_results, x='confidence', color='confidence', 
-                                    color_discrete_map={'HIGH': 'green', 'MEDIUM': 'orange', 'LOW': 'red'})
-            st.plotly_chart(fig_conf, use_container_width=True)
+            st.plotly_chart(confidence_histogram(df_results), use_container_width=True)
         
         # Detailed Table
         st.divider()
@@ -84,27 +55,30 @@ if feedback_data:
         # Filters
         filter_col1, filter_col2 = st.columns(2)
         with filter_col1:
-            selected_theme = st.multiselect("Filter by Theme", options=sorted(df_results['theme'].unique()))
+            selected_theme = st.multiselect("Filter by Theme", options=df_results['theme'].cat.categories.tolist())
         with filter_col2:
-            selected_conf = st.multiselect("Filter by Confirmation", options=sorted(df_results['confirmation'].unique()))
-        
-        # Apply Filters
-        filtered_df = df_results
-        if selected_theme:
-            filtered_df = filtered_df[filtered_df['theme'].isin(selected_theme)]
-        if selected_conf:
-            filtered_df = filtered_df[filtered_df['confirmation'].isin(selected_conf)]
+            selected_conf = st.multiselect("Filter by Confirmation", options=df_results['confirmation'].cat.categories.tolist())
+
+        # Apply Filters — fuse the masks so we slice (copy) at most once
+        if selected_theme or selected_conf:
+            mask = np.ones(len(df_results), dtype=bool)
+            if selected_theme:
+                mask &= df_results['theme'].isin(selected_theme).to_numpy()
+            if selected_conf:
+                mask &= df_results['confirmation'].isin(selected_conf).to_numpy()
+            filtered_df = df_results[mask]
+        else:
+            filtered_df = df_results
         
         # Export Functionality
-        csv = filtered_df.to_csv(index=False).encode('utf-8')
         st.download_button(
             label="📥 Export Filtered Results to CSV",
-            data=csv,
+            data=to_csv_bytes(filtered_df),
             file_name=f"axial_coding_export_{len(filtered_df)}_items.csv",
             mime="text/csv",
         )
         
-        st.dataframe(filtered_df[['alert_id', 'verdict', 'confirmation', 'theme', 'comment', 'confidence', 'reasoning']], use_container_width=True)
+        st.dataframe(filtered_df, use_container_width=True)
         
         # Drill Down
         st.divider()
@@ -113,9 +87,9 @@ if feedback_data:
         
         if selected_id:
             # Find in results
-            res_item = next((r for r in results_data if r['alert_id'] == selected_id), None)
+            res_item = results_by_id.get(selected_id)
             # Find in original feedback
-            fb_item = next((f for f in feedback_data if f['alert_id'] == selected_id), None)
+            fb_item = feedback_by_id.get(selected_id)
             
             det_col1, det_col2 = st.columns(2)
             
@@ -134,29 +108,17 @@ if feedback_data:
                 metadata = fb_item.get('metadata', {})
                 
                 # Extract AI Verdict (Initial) from traces
-                ai_verdict = "N/A"
-                if fb_item.get('traces'):
-                    for obs in fb_item['traces'][0].get('observations', []):
-                        if obs.get('type') == 'GENERATION' or (isinstance(obs.get('output'), str) and '"final_decision"' in obs.get('output')):
-                            try:
-                                output = obs.get('output', "")
-                                if isinstance(output, str) and output.strip().startswith('{'):
-                                    import json as json_lib
-                                    gen_data = json_lib.loads(output)
-                                    if "properties" in gen_data: gen_data = gen_data["properties"]
-                                    ai_verdict = gen_data.get("final_decision", "N/A")
-                                    break
-                            except:
-                                continue
+                # Parsed once in the cached loader
+                ai_verdict = fb_item.get('_ai_verdict', 'N/A')
 
                 st.write(f"**Human Comment:** {metadata.get('human_comment', 'N/A')}")
                 st.write(f"**Initial (AI) Verdict:** :blue[{ai_verdict}]")
                 st.write(f"**Final (Human) Verdict:** :green[{metadata.get('verdict', 'N/A')}]")
                 
-            # Show Trace observations if any
-            if fb_item.get('traces'):
+            # Show Trace observations if any (pre-serialized at load time)
+            if fb_item.get('_traces_json'):
                 with st.expander("View Raw Trace Observations"):
-                    st.json(fb_item['traces'][0].get('observations', []))
+                    st.code(fb_item['_traces_json'], language='json')
 
 else:
     st.info("👋 Welcome! Please run the classification pipeline to see results here.")
@@ -8,13 +8,74 @@ Usage:
 """
 
 import argparse
-import json
+import asyncio
+import re
 import sys
+import time
+from collections import defaultdict
+from itertools import islice
 from pathlib import Path
 from typing import Optional
-import time
 
-from langfuse import Langfuse
+import aiohttp
+import ijson
+import orjson
+
+# Cap on in-flight requests so we don't overrun the Langfuse server
+CONCURRENCY = 32
+
+# Sustained request rate against the Langfuse API; sized below the
+# server's rate limit so we never trigger 429 backoff cycles
+REQUESTS_PER_SECOND = 25.0
+
+
+class RateLimiter:
+    """Token-bucket limiter that paces requests proactively.
+
+    Refills at `rps` tokens per second up to a burst of `rps`; acquire()
+    takes one token or sleeps until the bucket refills. Unlike a blind
+    periodic sleep, idle time earns tokens, so throughput stays at the
+    configured rate without ever exceeding it.
+    """
+
+    def __init__(self, rps: float):
+        self.rps = rps
+        self.tokens = rps
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        while True:
+            async with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.rps, self.tokens + (now - self.updated) * self.rps
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+            await asyncio.sleep(1 / self.rps)
+
+# Traces repeat across alerts sharing a session; memoize their projected
+# GENERATION observations so each trace is fetched at most once per run
+_obs_cache: dict[str, list[dict]] = {}
+
+# Per-alert journal: one NDJSON line per completed alert so an
+# interrupted run resumes where it stopped instead of refetching
+PROGRESS_FILE = Path("data/feedback_alerts.ndjson")
+
+
+def _load_completed_traces(progress_file: Path) -> dict[str, list]:
+    """Reload alerts already fetched by prior runs from the NDJSON journal."""
+    completed = {}
+    if progress_file.exists():
+        with open(progress_file, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    record = orjson.loads(line)
+                    completed[record["alert_id"]] = record["traces"]
+    return completed
 
 
 def load_env_variables() -> tuple[str, str, str, str, Optional[str]]:
@@ -24,15 +85,17 @@ def load_env_variables() -> tuple[str, str, str, str, Optional[str]]:
     if not env_path.exists():
         raise FileNotFoundError(f".env file not found at {env_path}")
 
-    env_vars = {}
-    with open(env_path) as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "=" in line:
-                key, value = line.split("=", 1)
-                env_vars[key.strip()] = value.strip().strip('"')
+    # One C-level scan instead of per-line strip/startswith/split calls,
+    # with the same accepted syntax: split each non-comment line on its
+    # first "=", any key charset, values may contain "#" or quotes, and
+    # only surrounding quotes are dropped
+    env_vars = {
+        key: value.strip('"')
+        for key, value in re.findall(
+            r'(?m)^[ \t]*([^#\s][^=\n]*?)[ \t]*=[ \t]*(.*?)[ \t]*$',
+            env_path.read_text(),
+        )
+    }
 
     host = env_vars.get("LANGFUSE_HOST")
     public_key = env_vars.get("LANGFUSE_PUBLIC_KEY")
@@ -48,22 +111,43 @@ def load_env_variables() -> tuple[str, str, str, str, Optional[str]]:
     return host, public_key, secret_key, cf_token or "", cf_token
 
 
-def extract_alert_ids(feedback_file: Path) -> set[str]:
-    """Extract unique alert IDs from feedback file."""
+def iter_feedback_scores(feedback_file: Path):
+    """Stream feedback scores one at a time, whatever the file layout.
+
+    Peeks the first non-whitespace byte to dispatch between a JSON array
+    (streamed incrementally with ijson) and NDJSON (parsed per line), so
+    the whole file is never held in memory alongside its parsed form.
+    """
+    with open(feedback_file, 'rb') as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+
+        if first == b'[':
+            # use_float keeps numerics as float — ijson's default Decimal
+            # would be serialized as strings by orjson's default=str
+            yield from ijson.items(f, 'item', use_float=True)
+        else:
+            # Handle NDJSON
+            for line in f:
+                if line.strip():
+                    yield orjson.loads(line)
+
+
+def load_feedback(feedback_file: Path) -> list[dict]:
+    """Parse the feedback file exactly once for all pipeline stages."""
     print(f"📖 Loading feedback data from {feedback_file}...")
 
     try:
-        with open(feedback_file) as f:
-            content = f.read().strip()
-            if content.startswith('['):
-                scores = json.loads(content)
-            else:
-                # Handle NDJSON
-                scores = [json.loads(line) for line in content.splitlines() if line.strip()]
+        return list(iter_feedback_scores(feedback_file))
     except Exception as e:
         print(f"❌ Error loading feedback data: {e}")
         raise
 
+
+def extract_alert_ids(scores: list[dict]) -> set[str]:
+    """Extract unique alert IDs from pre-parsed feedback scores."""
     alert_ids = set()
     for score in scores:
         metadata = score.get("metadata", {})
@@ -75,45 +159,131 @@ def extract_alert_ids(feedback_file: Path) -> set[str]:
     return alert_ids
 
 
-def fetch_observations_for_trace(
-    langfuse: Langfuse,
+def _project_generation_obs(obs_dicts: list[dict]) -> list[dict]:
+    """Project inlined observation dicts down to GENERATION entries."""
+    return [
+        {
+            'input': obs_dict.get('input'),
+            'output': obs_dict.get('output'),
+            'metadata': obs_dict.get('metadata', {}),
+            'id': obs_dict.get('id'),
+            'name': obs_dict.get('name'),
+            'model': obs_dict.get('model'),
+        }
+        for obs_dict in obs_dicts
+        if obs_dict.get('type') == 'GENERATION'
+    ]
+
+
+async def fetch_observations_for_trace(
+    session: aiohttp.ClientSession,
+    host: str,
     trace_id: str,
-    observation_ids: list[str],
+    semaphore: asyncio.Semaphore,
+    limiter: RateLimiter,
 ) -> list[dict]:
-    """Fetch and filter observations to GENERATION type."""
-    generation_observations = []
+    """Fetch the trace's GENERATION observations in one paginated call.
 
-    for obs_id in observation_ids:
-        try:
-            obs = langfuse.api.observations.get(obs_id)
-
-            if hasattr(obs, 'model_dump'):
-                obs_dict = obs.model_dump()
-            elif hasattr(obs, 'dict'):
-                obs_dict = obs.dict()
-            else:
-                obs_dict = dict(obs)
-
-            # Filter to GENERATION type and extract only input,
-            # output, metadata
-            if obs_dict.get('type') == 'GENERATION':
-                generation_observations.append({
-                    'input': obs_dict.get('input'),
-                    'output': obs_dict.get('output'),
-                    'metadata': obs_dict.get('metadata', {}),
-                    'id': obs_dict.get('id'),
-                    'name': obs_dict.get('name'),
-                    'model': obs_dict.get('model'),
-                })
-        except Exception as e:
-            msg = f"Error fetching observation {obs_id}: {e}"
-            print(f"    ⚠️  {msg}")
-            continue
+    The list endpoint filters by type server-side, so a trace costs one
+    request per page of 100 instead of one request per observation ID.
+    """
+    cached = _obs_cache.get(trace_id)
+    if cached is not None:
+        return cached
 
+    generation_observations = []
+    page = 1
+
+    while True:
+        async with semaphore:
+            await limiter.acquire()
+            async with session.get(
+                f"{host}/api/public/observations",
+                params={
+                    "traceId": trace_id,
+                    "type": "GENERATION",
+                    "limit": 100,
+                    "page": page,
+                },
+            ) as resp:
+                resp.raise_for_status()
+                payload = await resp.json()
+
+        data = payload.get('data', [])
+        # Extract only input, output, metadata
+        for obs_dict in data:
+            generation_observations.append({
+                'input': obs_dict.get('input'),
+                'output': obs_dict.get('output'),
+                'metadata': obs_dict.get('metadata', {}),
+                'id': obs_dict.get('id'),
+                'name': obs_dict.get('name'),
+                'model': obs_dict.get('model'),
+            })
+
+        if len(data) < 100:
+            break
+        page += 1
+
+    _obs_cache[trace_id] = generation_observations
     return generation_observations
 
 
-def fetch_traces_from_langfuse(
+async def fetch_alert_traces(
+    session: aiohttp.ClientSession,
+    host: str,
+    alert_id: str,
+    semaphore: asyncio.Semaphore,
+    limiter: RateLimiter,
+) -> list[dict]:
+    """Fetch all traces (with GENERATION observations) for one alert."""
+    async with semaphore:
+        await limiter.acquire()
+        async with session.get(
+            f"{host}/api/public/traces",
+            params={
+                "sessionId": alert_id,
+                "limit": 100,
+                # Ask the server to inline full observation objects so no
+                # follow-up observation requests are needed at all
+                "expand": "observations",
+            },
+        ) as resp:
+            resp.raise_for_status()
+            payload = await resp.json()
+
+    traces_list = []
+    for trace_dict in payload.get('data', []):
+        trace_id = trace_dict.get('id')
+        observations = trace_dict.get('observations') or []
+        if observations and isinstance(observations[0], dict):
+            # Already inlined by the list endpoint — zero extra round-trips
+            observations = _project_generation_obs(observations)
+        elif trace_id and observations:
+            # Server returned bare observation IDs; fall back to the
+            # paginated per-trace fetch
+            observations = await fetch_observations_for_trace(
+                session, host, trace_id, semaphore, limiter
+            )
+        else:
+            # Clear observations if no IDs or can't fetch
+            observations = []
+
+        # Keep only the fields downstream consumers read; the raw list
+        # response carries many more that would bloat the output file
+        traces_list.append({
+            'id': trace_id,
+            'name': trace_dict.get('name'),
+            'input': trace_dict.get('input'),
+            'output': trace_dict.get('output'),
+            'metadata': trace_dict.get('metadata'),
+            'observations': observations,
+        })
+
+    return traces_list
+
+
+async def fetch_traces_from_langfuse(
     alert_ids: set[str],
     host: str,
     public_key: str,
@@ -122,158 +292,129 @@ def fetch_traces_from_langfuse(
     test_mode: bool = False,
     test_limit: int = 5,
 ) -> dict[str, dict]:
-    """Fetch traces and their GENERATION observations from Langfuse."""
-    from langfuse import Langfuse
+    """Fetch traces and their GENERATION observations from Langfuse.
 
+    The fetch is pure I/O, so alerts are fanned out concurrently over
+    one aiohttp session, gated by a semaphore instead of running one
+    round-trip at a time.
+    """
     print(f"\n🌐 Connecting to Langfuse at {host}...")
 
-    # Prepare additional headers for Cloudflare Access
-    # (key insight from scratchpad.py)
-    additional_headers = {}
-    if cf_token:
-        additional_headers["cf-access-token"] = cf_token
-
-    # Create Langfuse client with Cloudflare Access token
-    langfuse = Langfuse(
-        public_key=public_key,
-        secret_key=secret_key,
-        host=host,
-        additional_headers=additional_headers if additional_headers else None
-    )
-
-    print("✅ Using Langfuse SDK client with CF Access headers")
-
-    traces_by_alert = {}
-    alert_ids_list = sorted(list(alert_ids))
+    # Cloudflare Access header (key insight from scratchpad.py)
+    headers = {"cf-access-token": cf_token} if cf_token else {}
+    auth = aiohttp.BasicAuth(public_key, secret_key)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    limiter = RateLimiter(REQUESTS_PER_SECOND)
 
-    # Limit alerts in test mode
+    # Test mode sorts for a deterministic subset; a full run iterates the
+    # set directly — output ordering is imposed later by create_linked_data
     if test_mode:
-        alert_ids_list = alert_ids_list[:test_limit]
-        msg = f"TEST MODE: Processing only {len(alert_ids_list)} alerts"
+        selected = list(islice(sorted(alert_ids), test_limit))
+        msg = f"TEST MODE: Processing only {len(selected)} alerts"
         print(f"⚠️  {msg}")
-
-    print(f"\n📡 Fetching {len(alert_ids_list)} traces...")
+    else:
+        selected = alert_ids
+
+    # Resume from the journal: alerts completed by a prior run are reused
+    traces_by_alert = _load_completed_traces(PROGRESS_FILE)
+    pending = [a for a in selected if a not in traces_by_alert]
+    if len(pending) < len(selected):
+        resumed = len(selected) - len(pending)
+        print(f"♻️  Resuming: {resumed} alerts already journaled")
+
+    total = len(pending)
+    print(f"\n📡 Fetching {total} traces...")
     print("=" * 80)
 
-    for idx, alert_id in enumerate(alert_ids_list, 1):
-        try:
-            # Use the Langfuse SDK's API to list traces by session_id
-            # The API should support filtering by session_id parameter
-            traces_response = langfuse.api.trace.list(
-                session_id=alert_id,
-                limit=100
-            )
+    done = 0
+    first_error_shown = False
 
-            # Convert trace objects to dicts for JSON serialization
-            if traces_response and hasattr(traces_response, 'data'):
-                traces_list = []
-                for trace in traces_response.data:
-                    # Convert trace to dict
-                    if hasattr(trace, 'model_dump'):
-                        trace_dict = trace.model_dump()
-                    elif hasattr(trace, 'dict'):
-                        trace_dict = trace.dict()
-                    else:
-                        trace_dict = dict(trace)
-
-                    # Fetch observations for this trace
-                    trace_id = trace_dict.get('id')
-                    observation_ids = trace_dict.get('observations', [])
-                    if trace_id and observation_ids:
-                        observations = fetch_observations_for_trace(
-                            langfuse, trace_id, observation_ids
-                        )
-                        trace_dict['observations'] = observations
-
-                        if idx == 1 and observations:
-                            obs_msg = (
-                                f"Fetched {len(observations)} GENERATION "
-                                "observation(s) for first trace"
-                            )
-                            print(f"  ✅ {obs_msg}")
-                    else:
-                        # Clear observations if no IDs or can't fetch
-                        trace_dict['observations'] = []
-
-                    traces_list.append(trace_dict)
-
-                traces_by_alert[alert_id] = traces_list
-
-                if idx == 1 and traces_list:
-                    msg = (
-                        f"Successfully fetched {len(traces_list)} "
-                        "trace(s) for first alert"
-                    )
-                    print(f"  ✅ {msg}")
-            else:
-                traces_by_alert[alert_id] = []
-
-            if idx % 50 == 0:
-                print(
-                    f"[{idx}/{len(alert_ids_list)}] "
-                    f"Fetched {idx} traces..."
-                )
-                time.sleep(0.1)  # Small rate limiting
+    # One pooled session for the whole run: keep-alive connections are
+    # reused across requests, so the TLS/TCP handshake is paid once per
+    # connection rather than once per call
+    connector = aiohttp.TCPConnector(
+        limit=CONCURRENCY * 2,
+        keepalive_timeout=30,
+    )
 
-        except Exception as e:
-            if idx == 1:
-                error_msg = (
-                    f"Error on first trace: {type(e).__name__}: "
-                    f"{str(e)[:200]}"
-                )
-                print(f"  ⚠️  {error_msg}")
-                import traceback
-                print(f"  Full traceback:\n{traceback.format_exc()}")
-            traces_by_alert[alert_id] = []
+    PROGRESS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(PROGRESS_FILE, 'ab') as journal:
+        async with aiohttp.ClientSession(
+            auth=auth,
+            headers=headers,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=30),
+        ) as session:
+
+            async def fetch_with_progress(alert_id: str) -> None:
+                nonlocal done, first_error_shown
+                try:
+                    traces_list = await fetch_alert_traces(
+                        session, host, alert_id, semaphore, limiter
+                    )
+                except Exception as e:
+                    if not first_error_shown:
+                        first_error_shown = True
+                        error_msg = (
+                            f"Error on first failing trace: {type(e).__name__}: "
+                            f"{str(e)[:200]}"
+                        )
+                        print(f"  ⚠️  {error_msg}")
+                    # Not journaled, so the next run retries this alert
+                    traces_by_alert[alert_id] = []
+                else:
+                    traces_by_alert[alert_id] = traces_list
+                    journal.write(orjson.dumps(
+                        {"alert_id": alert_id, "traces": traces_list},
+                        default=str,
+                    ) + b"\n")
+                    journal.flush()
+
+                done += 1
+                if done % 50 == 0:
+                    print(f"[{done}/{total}] Fetched {done} traces...")
+
+            await asyncio.gather(
+                *(fetch_with_progress(alert_id) for alert_id in pending)
+            )
 
     print("=" * 80)
-    successful = sum(1 for traces in traces_by_alert.values() if traces)
+    successful = sum(
+        1 for alert_id in selected if traces_by_alert.get(alert_id)
+    )
     print(
         f"✅ Successfully fetched traces for {successful}/"
-        f"{len(alert_ids_list)} alerts"
+        f"{len(selected)} alerts"
     )
     return traces_by_alert
 
 
 def create_linked_data(
-    feedback_file: Path,
+    scores: list[dict],
     traces_by_alert: dict[str, dict],
 ) -> list[dict]:
     """Create linked data combining feedback and traces."""
     print("\n🔗 Linking feedback with traces...")
 
-    try:
-        with open(feedback_file) as f:
-            content = f.read().strip()
-            if content.startswith('['):
-                scores = json.loads(content)
-            else:
-                # Handle NDJSON
-                scores = [json.loads(line) for line in content.splitlines() if line.strip()]
-    except Exception as e:
-        print(f"❌ Error loading feedback data for linking: {e}")
-        raise
-
-    # Group feedback scores by alert_id
-    feedback_by_alert = {}
+    # Group feedback scores by alert_id in one branch-free pass
+    scores_by_alert = defaultdict(list)
     for score in scores:
         metadata = score.get("metadata", {})
         alert_id = metadata.get("alert_id") or score.get("sessionId")
         if alert_id:
-            if alert_id not in feedback_by_alert:
-                feedback_by_alert[alert_id] = {
-                    "alert_id": alert_id,
-                    "feedback_scores": [],
-                    "traces": traces_by_alert.get(alert_id, []),
-                    "metadata": metadata,
-                }
-            feedback_by_alert[alert_id]["feedback_scores"].append(score)
-
-    # Convert to list sorted by alert_id
-    linked_data = sorted(
-        feedback_by_alert.values(),
-        key=lambda x: x["alert_id"]
-    )
+            scores_by_alert[alert_id].append(score)
+
+    # Assemble records sorted by alert_id; metadata comes from the first
+    # score seen for the alert, matching the previous behavior
+    linked_data = [
+        {
+            "alert_id": alert_id,
+            "feedback_scores": alert_scores,
+            "traces": traces_by_alert.get(alert_id, []),
+            "metadata": alert_scores[0].get("metadata", {}),
+        }
+        for alert_id, alert_scores in sorted(scores_by_alert.items())
+    ]
 
     return linked_data
 
@@ -287,8 +428,10 @@ def save_linked_data(
 
     output_file.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(output_file, "w") as f:
-        json.dump(linked_data, f, indent=2, default=str)
+    # Compact output: downstream consumers parse it programmatically, and
+    # skipping pretty-printing halves both serialize time and file size
+    with open(output_file, "wb") as f:
+        f.write(orjson.dumps(linked_data, default=str))
 
     print(f"✅ Saved {len(linked_data)} alert records")
     total_scores = sum(
@@ -335,11 +478,14 @@ def main():
         print(f"   Host: {host}")
         print(f"   Public Key: {public_key[:20]}...")
 
+        # Parse feedback once; both stages below reuse the list
+        scores = load_feedback(feedback_file)
+
         # Extract alert IDs from feedback
-        alert_ids = extract_alert_ids(feedback_file)
+        alert_ids = extract_alert_ids(scores)
 
         # Fetch traces from Langfuse
-        traces_by_alert = fetch_traces_from_langfuse(
+        traces_by_alert = asyncio.run(fetch_traces_from_langfuse(
             alert_ids,
             host,
             public_key,
@@ -347,10 +493,10 @@ def main():
             cf_token,
             test_mode=args.test,
             test_limit=args.limit
-        )
+        ))
 
         # Create linked data
-        linked_data = create_linked_data(feedback_file, traces_by_alert)
+        linked_data = create_linked_data(scores, traces_by_alert)
 
         # Save to file
         save_linked_data(linked_data, output_file)
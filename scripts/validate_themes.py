@@ -4,15 +4,90 @@ Validate theme analysis by examining human comments with their full trace contex
 This script analyzes comments alongside the raw alert data to ensure theme categorization is accurate.
 """
 
-import json
+import os
+import re
 from collections import defaultdict
-from typing import Dict, List, Any
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any
 
+import ijson
 
-def load_data(filepath: str) -> List[Dict]:
-    """Load feedback alerts with traces."""
-    with open(filepath, 'r') as f:
-        return json.load(f)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Theme keyword table; matching stays plain-substring (no word
+# boundaries) to keep the original semantics
+THEME_KEYWORDS = [
+    ('Internal/Authorized Team', 'Contains internal team keywords',
+     ('internal team', 'authorized', 'it team', 'service account',
+      'admin', 'soc team', 'security team', 'deployment', 'wa user')),
+    ('AI Inconsistency', 'References previous alerts or inconsistency',
+     ('previous detections', 'does not match', 'same hash', 'same file',
+      'similar', 'inconsistent', 'already', 'duplicate')),
+    ('Legitimate Software', 'References legitimate software',
+     ('legitimate', 'known good', 'software', 'application', 'binary',
+      'lenovo', 'vantage', 'clipboard', 'custom app', 'gaming',
+      'install', 'driver', 'utility')),
+    ('Confirmed Malicious', 'Confirms malicious activity',
+     ('malicious', 'threat', 'suspicious software', 'not approved',
+      'blocked', 'contained', 'real threat', 'true positive')),
+    ('Insufficient Evidence', 'Lacks supporting evidence',
+     ('no additional indication', 'no evidence', 'no malicious activity',
+      'no supporting', 'no observables', 'no indication')),
+    ('Test/Dev Activity', 'Test or development environment',
+     ('eicar', 'test', 'rules test')),
+    ('PHI/Escalation', 'PHI or compliance concern',
+     ('phi', 'hipaa', 'ct folder', 'health', 'patient')),
+]
+
+# Preferred path: an Aho–Corasick automaton over every keyword matches
+# all themes in one linear pass over the comment. The fallback compiles
+# one alternation per theme so both paths keep identical plain-substring
+# semantics (e.g. 'admin' still matches inside 'admins').
+if ahocorasick is not None:
+    _AUTOMATON = ahocorasick.Automaton()
+    for _theme, _indicator, _keywords in THEME_KEYWORDS:
+        for _kw in _keywords:
+            _AUTOMATON.add_word(_kw, (_theme, _indicator))
+    _AUTOMATON.make_automaton()
+else:
+    _AUTOMATON = None
+
+_THEME_PATTERNS = [
+    (theme, indicator, re.compile('|'.join(re.escape(kw) for kw in keywords)))
+    for theme, indicator, keywords in THEME_KEYWORDS
+]
+
+
+@lru_cache(maxsize=None)
+def _match_themes(comment_lower: str) -> tuple:
+    """Return (theme, indicator) hits for a lowercased comment, in table order.
+
+    Memoized: feedback corpora repeat canned comments heavily, so each
+    distinct comment is classified once.
+    """
+    if _AUTOMATON is not None:
+        hits = {value for _, value in _AUTOMATON.iter(comment_lower)}
+        return tuple((theme, indicator) for theme, indicator, _ in THEME_KEYWORDS
+                     if (theme, indicator) in hits)
+    return tuple(
+        (theme, indicator)
+        for theme, indicator, pattern in _THEME_PATTERNS
+        if pattern.search(comment_lower)
+    )
+
+
+def iter_alerts(filepath: str):
+    """Stream feedback alerts one at a time with constant memory.
+
+    The linked corpus inlines traces and observations, so parsing it
+    whole scales RSS with the file; ijson yields one alert at a time.
+    """
+    with open(filepath, 'rb') as f:
+        yield from ijson.items(f, 'item', use_float=True)
 
 
 def extract_alert_context(trace: Dict) -> Dict[str, Any]:
@@ -64,107 +139,65 @@ def analyze_comment_with_context(
         analysis['file_name'] = trace_context.get('file_name', '')
         analysis['user_name'] = trace_context.get('user_name', '')
     
-    # Theme 1: Internal/Authorized Team Activity
-    internal_keywords = [
-        'internal team', 'authorized', 'it team', 'service account',
-        'admin', 'soc team', 'security team', 'deployment', 'wa user'
-    ]
-    if any(kw in comment_lower for kw in internal_keywords):
-        analysis['suggested_themes'].append('Internal/Authorized Team')
-        analysis['key_indicators'].append('Contains internal team keywords')
-    
-    # Theme 2: AI Verdict Inconsistency
-    inconsistency_keywords = [
-        'previous detections', 'does not match', 'same hash', 'same file',
-        'similar', 'inconsistent', 'already', 'duplicate'
-    ]
-    if any(kw in comment_lower for kw in inconsistency_keywords):
-        analysis['suggested_themes'].append('AI Inconsistency')
-        analysis['key_indicators'].append('References previous alerts or inconsistency')
-    
-    # Theme 3: Legitimate Software/Application
-    software_keywords = [
-        'legitimate', 'known good', 'software', 'application', 'binary',
-        'lenovo', 'vantage', 'clipboard', 'custom app', 'gaming',
-        'install', 'driver', 'utility'
-    ]
-    if any(kw in comment_lower for kw in software_keywords):
-        analysis['suggested_themes'].append('Legitimate Software')
-        analysis['key_indicators'].append('References legitimate software')
-    
-    # Theme 4: Confirmed Malicious
-    malicious_keywords = [
-        'malicious', 'threat', 'suspicious software', 'not approved',
-        'blocked', 'contained', 'real threat', 'true positive'
-    ]
-    if any(kw in comment_lower for kw in malicious_keywords) and analysis['verdict'] == 'True Positive - Malicious':
-        analysis['suggested_themes'].append('Confirmed Malicious')
-        analysis['key_indicators'].append('Confirms malicious activity')
-    
-    # Theme 5: Insufficient Evidence
-    evidence_keywords = [
-        'no additional indication', 'no evidence', 'no malicious activity',
-        'no supporting', 'no observables', 'no indication'
-    ]
-    if any(kw in comment_lower for kw in evidence_keywords):
-        analysis['suggested_themes'].append('Insufficient Evidence')
-        analysis['key_indicators'].append('Lacks supporting evidence')
-    
-    # Theme 6: Test/Development Activity
-    test_keywords = ['eicar', 'test', 'rules test']
-    if any(kw in comment_lower for kw in test_keywords):
-        analysis['suggested_themes'].append('Test/Dev Activity')
-        analysis['key_indicators'].append('Test or development environment')
-    
-    # Theme 7: PHI/Escalation Concerns
-    phi_keywords = ['phi', 'hipaa', 'ct folder', 'health', 'patient']
-    if any(kw in comment_lower for kw in phi_keywords):
-        analysis['suggested_themes'].append('PHI/Escalation')
-        analysis['key_indicators'].append('PHI or compliance concern')
-    
+    for theme, indicator in _match_themes(comment_lower):
+        # Confirmed Malicious also requires the matching human verdict
+        if (theme == 'Confirmed Malicious'
+                and analysis['verdict'] != 'True Positive - Malicious'):
+            continue
+        analysis['suggested_themes'].append(theme)
+        analysis['key_indicators'].append(indicator)
+
     return analysis
 
 
+def classify(args: tuple) -> Dict[str, Any]:
+    """Worker entrypoint: unpack one (comment, metadata, trace_context) tuple.
+
+    Top-level so it pickles for ProcessPoolExecutor; each worker builds
+    its own automaton/caches at import time.
+    """
+    comment, alert_metadata, trace_context = args
+    return analyze_comment_with_context(comment, alert_metadata, trace_context)
+
+
 def main():
     print("="*80)
     print("THEME VALIDATION: Analyzing Comments with Trace Context")
     print("="*80)
     
-    # Load data
-    print("\n📖 Loading feedback alerts with traces...")
-    alerts = load_data('data/feedback_alerts.json')
-    print(f"✅ Loaded {len(alerts)} alerts")
-    
-    # Filter to alerts with comments
-    alerts_with_comments = [
-        alert for alert in alerts 
-        if alert.get('metadata', {}).get('human_comment')
-    ]
-    print(f"✅ Found {len(alerts_with_comments)} alerts with human comments")
-    
-    # Analyze each comment with context
+    # Stream alerts and analyze comments in one pass — the filter and
+    # analysis happen per item so the corpus is never fully materialized
+    print("\n📖 Streaming feedback alerts with traces...")
     print("\n🔍 Analyzing comments with trace context...\n")
-    
-    analyses = []
-    for alert in alerts_with_comments:
-        comment = alert['metadata']['human_comment']
-        
+
+    work = []
+    total_alerts = 0
+    with_comments = 0
+    for alert in iter_alerts('data/feedback_alerts.json'):
+        total_alerts += 1
+        comment = alert.get('metadata', {}).get('human_comment')
+        if not comment:
+            continue
+        with_comments += 1
+
         # Skip empty or generic comments
-        if not comment or len(comment.strip()) < 10:
+        if len(comment.strip()) < 10:
             continue
-        
+
         # Extract trace context if available
         trace_context = {}
         if alert.get('traces'):
             trace_context = extract_alert_context(alert['traces'][0])
-        
-        analysis = analyze_comment_with_context(
-            comment,
-            alert['metadata'],
-            trace_context
-        )
-        analyses.append(analysis)
-    
+
+        work.append((comment, alert['metadata'], trace_context))
+
+    # Classification is pure CPU work over independent rows — fan it out
+    # across cores; aggregation below stays single-threaded
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        analyses = list(executor.map(classify, work, chunksize=256))
+
+    print(f"✅ Loaded {total_alerts} alerts")
+    print(f"✅ Found {with_comments} alerts with human comments")
     print(f"✅ Analyzed {len(analyses)} substantive comments\n")
     
     # Group by themes